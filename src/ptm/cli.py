@@ -19,8 +19,10 @@ All target arguments are available to the build script via Parameter.
 import os
 import sys
 
+from .system.cache import clear_stat_cache
 from .system.logger import plog
-from .syntax.include import include
+from .syntax.include import include, clear_include_cache
+from .syntax.loader import prewarm_lex_caches
 from .system.builder import builder
 from .syntax.param import Parameter
 from .system.scheduler import BuildScheduler
@@ -33,26 +35,25 @@ PTM_ARGS = [
     {'flags': ['-j', '--jobs'], 'key': 'jobs', 'action': 'store', 'type': int, 'default': os.cpu_count()},
 ]
 
+# Flag dispatch and defaults derived from PTM_ARGS once, not per parse call
+_PTM_FLAG_MAP = {flag: arg_def for arg_def in PTM_ARGS for flag in arg_def['flags']}
+_PTM_ARG_DEFAULTS = {
+    arg_def['key']: arg_def.get('default', False)
+    for arg_def in PTM_ARGS
+    if 'default' in arg_def or arg_def['action'] == 'store_true'
+}
+
 def parse_ptm_args(args):
-    ptm_args = {}
+    ptm_args = dict(_PTM_ARG_DEFAULTS)
     target_name = None
     target_args = []
 
-    flag_map = {}
-    for arg_def in PTM_ARGS:
-        for flag in arg_def['flags']:
-            flag_map[flag] = arg_def
-        if 'default' in arg_def:
-            ptm_args[arg_def['key']] = arg_def['default']
-        elif arg_def['action'] == 'store_true':
-            ptm_args[arg_def['key']] = False
-
     i = 0
     while i < len(args):
         arg = args[i]
 
-        if arg in flag_map:
-            arg_def = flag_map[arg]
+        if arg in _PTM_FLAG_MAP:
+            arg_def = _PTM_FLAG_MAP[arg]
             key = arg_def['key']
             if arg_def['action'] == 'store_true':
                 ptm_args[key] = True
@@ -94,7 +95,7 @@ def parse_target_args(args):
             else:
                 value = True
                 i += 1
-            param.add({key: value})
+            param.add({sys.intern(key): value})
         else:
             raise ValueError(f"Unexpected positional argument: {arg}")
 
@@ -132,13 +133,15 @@ def main():
 
     try:
         while True:
+            clear_stat_cache()
+            prewarm_lex_caches(build_file)
             _ = include(build_file, param)
             tree = builder.generate_dependency_tree(target_name)
 
             if daemon_mode:
                 watcher = FileSystemWatcher(tree.generate_dependencies() | builder.ptm_srcs)
 
-            scheduler = BuildScheduler(tree.generate_build_order(), max_jobs)
+            scheduler = BuildScheduler(tree.generate_build_order(), max_jobs, builder.build_cache)
             exitcode, known_modifies = scheduler.run()
 
             if not daemon_mode:
@@ -162,6 +165,7 @@ def main():
 
                 watcher.clean()
                 builder.clean()
+                clear_include_cache()
 
     except KeyboardInterrupt:
         sys.exit(0)
@@ -1,19 +1,25 @@
 import os
 from typing import Any
 
+# Bound once: every de-sugared ${VAR} reference lands here, and going
+# through the module global on each lookup is avoidable overhead.
+_environ = os.environ
+
 class EnvVar:
-    
+
+    __slots__ = ()
+
     def __getitem__(self, key: str) -> str:
-        return os.environ.get(key, "")
+        return _environ.get(key, "")
     
     def __setitem__(self, key: str, value: str) -> None:
-        os.environ[key] = value
+        _environ[key] = value
     
     def __contains__(self, key: str) -> bool:
-        return key in os.environ
+        return key in _environ
     
     def __delitem__(self, key: str) -> None:
-        del os.environ[key]
+        del _environ[key]
     
     def __getattr__(self, name: str) -> str:
         return self[name]
@@ -25,6 +31,6 @@ class EnvVar:
         del self[name]
 
     def get(self, key: str, default: Any = None) -> str | None:
-        return os.environ.get(key, str(default) if default else None)
+        return _environ.get(key, str(default) if default else None)
 
 environ = EnvVar()
@@ -4,7 +4,6 @@ Module for importing and processing PTM files with environment variable support.
 
 import os
 import sys
-import inspect
 from importlib.util import spec_from_file_location, module_from_spec
 from typing import Optional
 from pathlib import Path
@@ -15,16 +14,22 @@ from .param import Parameter
 from ..system.builder import task, target, template, builder
 from .arglist import ArgList
 
+# Modules already executed in this process, keyed by real path. Repeated
+# includes of an unchanged file reuse the executed module instead of
+# re-running its top-level code.
+_included_modules: dict = {}
+
+def clear_include_cache() -> None:
+    """Forget executed modules so the next include re-runs them."""
+    _included_modules.clear()
+
 def _get_parent_parameter():
-    caller_frame = inspect.stack()
-    caller_frame = caller_frame[2].frame
-    return caller_frame.f_globals.get("param", None)
+    # sys._getframe skips the FrameInfo/source-context work inspect.stack does
+    return sys._getframe(2).f_globals.get("param", None)
 
 def _get_parent_globals():
     """Get the global namespace from the parent caller."""
-    caller_frame = inspect.stack()
-    caller_frame = caller_frame[2].frame
-    return caller_frame.f_globals
+    return sys._getframe(2).f_globals
 
 
 def include(file_path: str, param: Optional[Parameter] = None) -> str:
@@ -43,14 +48,31 @@ def include(file_path: str, param: Optional[Parameter] = None) -> str:
 
     file_real_path = os.path.abspath(file_path)
 
+    if param is None:
+        param = _get_parent_parameter()
+
+    if os.path.exists(file_real_path):
+        cached = _included_modules.get(file_real_path)
+        if (cached is not None
+                and cached.__ptm_mtime_ns__ == os.stat(file_real_path).st_mtime_ns
+                and cached.param is param):
+            plog.debug(f"Reusing included module '{file_real_path}'")
+            builder.ptm_srcs.add(file_real_path)
+            return cached
+
     last_dir = os.getcwd()
     work_dir = os.path.dirname(file_real_path)
     plog.info(f"Entering directory '{work_dir}'")
     os.chdir(work_dir)
 
-    if not os.path.exists(file_real_path):
+    # Capture the mtime before loading: the executed module corresponds to
+    # the file as it was read, so an edit racing the execution must not be
+    # masked by keying the memo with a newer stamp.
+    try:
+        src_mtime_ns = os.stat(file_real_path).st_mtime_ns
+    except OSError:
         raise FileNotFoundError(f"File does not exist: {file_real_path}")
-    
+
     builder.ptm_srcs.add(file_real_path)
 
     module_name = file_real_path
@@ -85,12 +107,13 @@ def include(file_path: str, param: Optional[Parameter] = None) -> str:
     module.__dict__['CURDIR'] = Path(work_dir)
     module.__dict__['CURFILE'] = Path(file_real_path)
 
-    if param is None:
-        param = _get_parent_parameter()
     module.param = param
 
     spec.loader.exec_module(module)
 
+    module.__ptm_mtime_ns__ = src_mtime_ns
+    _included_modules[file_real_path] = module
+
     plog.info(f"Leaving directory '{work_dir}'")
     os.chdir(last_dir)
 
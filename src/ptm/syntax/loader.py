@@ -4,12 +4,16 @@ Module for loading and processing PTM files with environment variable support.
 
 import os
 import re
+import hashlib
+import functools
+from concurrent.futures import ThreadPoolExecutor
 from importlib.abc import SourceLoader
-from itertools import product
 from types import ModuleType
-from typing import Callable, Pattern, List, Optional
+from typing import Callable, Pattern, List, Optional, Union
 
+from ..system.cache import cached_stat, invalidate_stat
 from ..system.logger import plog
+from ..version import __version__
 
 
 def re_group(*sub: str) -> str:
@@ -32,32 +36,55 @@ shell_prefix_map = {
     "$&": "ptm.exec_cmd_stdout_stderr",
 }
 
-def _string_prefixes() -> set[str]:
-    """
-    Generate all valid string prefixes for Python strings.
-    
-    Returns:
-        set[str]: Set of all valid string prefixes
-    """
-    valid_prefixes = ['b', 'r', 'u', 'f', 'br', 'fr']
-    result = {''}
-    for prefix in valid_prefixes:
-        result.update(''.join(p) for p in product(*[[c, c.upper()] for c in prefix]))
-        result.update(''.join(p) for p in product(*[[c, c.upper()] for c in prefix[::-1]]))
-    return list(result) + list(f"\\{prefix}" for prefix in shell_prefix_map.keys())
+# All valid Python string prefixes (every case/order variant of b, r, u, f,
+# br, fr) followed by the escaped shell prefixes. Longest first so the
+# alternation needs no backtracking on multi-character prefixes.
+_string_prefixes = (
+    'BR', 'Br', 'FR', 'Fr', 'RB', 'RF', 'Rb', 'Rf',
+    'bR', 'br', 'fR', 'fr', 'rB', 'rF', 'rb', 'rf',
+    'B', 'F', 'R', 'U', 'b', 'f', 'r', 'u', '',
+    r'\$>>', r'\$>', r'\$&', r'\$',
+)
 
 
 # Regular expression patterns for lexing
 lr_space = r'[ \f\t]*'
 lr_env_var = r'\${' + lr_space + r'(\w+)' + lr_space + r'}'
-lr_str_start = re_group(*_string_prefixes()) + r"('''|\"\"\"|'|\")"
+lr_str_start = re_group(*_string_prefixes) + r"('''|\"\"\"|'|\")"
 lr_fvar_start = r'[^\${]*(({{)*{(?!{))'
 
 # Compiled regex patterns
 env_var_pattern: Pattern = re.compile(lr_env_var)
+include_pattern: Pattern = re.compile(r'''include\(\s*(?P<quote>['\"])(?P<path>[^'\"\n]+)(?P=quote)''')
 str_start_pattern: Pattern = re.compile(lr_str_start)
 fvar_start_pattern: Pattern = re.compile(lr_fvar_start)
 
+# Close delimiters come in a handful of shapes ("'", '"""', "}", ...), so
+# their compiled patterns are memoized instead of relying on re's tiny
+# internal cache.
+_close_patterns: dict[str, Pattern] = {}
+
+def _close_pattern(close: str) -> Pattern:
+    pattern = _close_patterns.get(close)
+    if pattern is None:
+        pattern = re.compile(close)
+        _close_patterns[close] = pattern
+    return pattern
+
+
+# f-string expression terminators, possibly preceded by ${VAR} references
+# (e.g. "${USER}}"). Memoized per close delimiter for the same reason as
+# _close_patterns: recompiling inside _process_fstring_code put a regex
+# parse on every f-string expression.
+_fstr_close_patterns: dict[str, Pattern] = {}
+
+def _fstr_close_pattern(close: str) -> Pattern:
+    pattern = _fstr_close_patterns.get(close)
+    if pattern is None:
+        pattern = re.compile(fr"({lr_env_var})*{close}")
+        _fstr_close_patterns[close] = pattern
+    return pattern
+
 
 def replace_env_var(code: str) -> str:
     """
@@ -69,7 +96,9 @@ def replace_env_var(code: str) -> str:
     Returns:
         str: The processed code with environment variables replaced
     """
-    return env_var_pattern.sub(lambda m: f"ptm.environ.{m.group(1).strip()}", code)
+    # The surrounding whitespace in `${ NAME }` sits outside the capture
+    # group, so group(1) is already trimmed.
+    return env_var_pattern.sub(lambda m: f"ptm.environ.{m.group(1)}", code)
 
 
 class LexerState:
@@ -95,31 +124,51 @@ class LexerMachine:
     def __init__(self):
         self.result_lines: List[str] = []
         self.state_stack: List[LexerState] = [LexerState("code", "")]
+        self._code_fragments: List[int] = []
+
+    def _append_code(self, fragment: str) -> None:
+        """Append a code fragment; env vars are substituted in one batch later."""
+        self._code_fragments.append(len(self.result_lines))
+        self.result_lines.append(fragment)
 
-    def process_line(self, line: str) -> None:
-        """Process a single line of input."""
+    def process(self, text: str) -> None:
+        """Process the whole source buffer in a single pass."""
         pos = 0
-        while pos < len(line):
+        end = len(text)
+        while pos < end:
             current_state = self.state_stack[-1]
             if current_state.type == "code":
-                pos += self._process_code(line[pos:])
+                pos = self._process_code(text, pos)
             elif current_state.type == "string":
-                pos += self._process_const_string(line[pos:], current_state.close)
+                pos = self._process_const_string(text, pos, current_state.close)
             elif current_state.type == "fstring":
-                pos += self._process_fstring(line[pos:], current_state.close)
+                pos = self._process_fstring(text, pos, current_state.close)
             elif current_state.type == "fstring_code":
-                pos += self._process_fstring_code(line[pos:], current_state.close)
+                pos = self._process_fstring_code(text, pos, current_state.close)
             elif current_state.type == "shell":
-                pos += self._process_fstring(line[pos:], current_state.close, ")")
+                pos = self._process_fstring(text, pos, current_state.close, ")")
             else:
                 assert False, f"Invalid state: {current_state.type}"
 
+        # Substitute ${VAR} references across all code fragments with a
+        # single regex pass instead of one call per fragment. NUL never
+        # appears in valid source, so it is a safe join sentinel; if the
+        # input somehow contains one, fall back to per-fragment calls.
+        if self._code_fragments:
+            if "\x00" in text:
+                for i in self._code_fragments:
+                    self.result_lines[i] = replace_env_var(self.result_lines[i])
+            else:
+                joined = "\x00".join(self.result_lines[i] for i in self._code_fragments)
+                for i, fragment in zip(self._code_fragments, replace_env_var(joined).split("\x00")):
+                    self.result_lines[i] = fragment
+
 
-    def _process_code(self, text: str) -> int:
-        match_str_start = str_start_pattern.search(text)
+    def _process_code(self, text: str, pos: int) -> int:
+        match_str_start = str_start_pattern.search(text, pos)
 
         if match_str_start:
-            self.result_lines.append(replace_env_var(text[:match_str_start.start()]))
+            self._append_code(text[pos:match_str_start.start()])
 
             prefix_type = match_str_start.group(1)
             quote_type = match_str_start.group(2)
@@ -137,80 +186,105 @@ class LexerMachine:
 
             return match_str_start.end()
         else:
-            self.result_lines.append(replace_env_var(text))
+            self._append_code(text[pos:])
             return len(text)
 
-    def _process_const_string(self, text: str, close: str) -> int:
-        match_str_close = re.search(close, text)
+    def _process_const_string(self, text: str, pos: int, close: str) -> int:
+        match_str_close = _close_pattern(close).search(text, pos)
 
         if match_str_close:
-            self.result_lines.append(text[:match_str_close.end()])
+            self.result_lines.append(text[pos:match_str_close.end()])
             self.state_stack.pop()
             return match_str_close.end()
         else:
-            self.result_lines.append(text)
+            self.result_lines.append(text[pos:])
             return len(text)
 
 
-    def _process_fstring(self, text: str, close: str, suffix: Optional[str] = None) -> int:
-        match_fstr_close = re.search(close, text)
-        match_fvar_start = re.search(fvar_start_pattern, text[:match_fstr_close.end()]) if match_fstr_close else re.search(fvar_start_pattern, text)
+    def _process_fstring(self, text: str, pos: int, close: str, suffix: Optional[str] = None) -> int:
+        match_fstr_close = _close_pattern(close).search(text, pos)
+        match_fvar_start = fvar_start_pattern.search(text, pos, match_fstr_close.end()) if match_fstr_close else fvar_start_pattern.search(text, pos)
 
         if match_fvar_start:
-            self.result_lines.append(text[:match_fvar_start.end()])
+            self.result_lines.append(text[pos:match_fvar_start.end()])
             self.state_stack.append(LexerState("fstring_code", match_fvar_start.group(1)))
             return match_fvar_start.end()
         else:
             if match_fstr_close:
-                self.result_lines.append(text[:match_fstr_close.end()])
+                self.result_lines.append(text[pos:match_fstr_close.end()])
                 self.state_stack.pop()
                 if suffix:
                     self.result_lines.append(suffix)
                 return match_fstr_close.end()
             else:
-                self.result_lines.append(text)
+                self.result_lines.append(text[pos:])
                 return len(text)
-    
-    def _process_fstring_code(self, text: str, close: str) -> int:
-        match_fstr_close = re.search(fr"({lr_env_var})*{close}", text)
-        match_sub_str_start = re.search(str_start_pattern, text[:match_fstr_close.end()]) if match_fstr_close else re.search(str_start_pattern, text)
+
+    def _process_fstring_code(self, text: str, pos: int, close: str) -> int:
+        match_fstr_close = _fstr_close_pattern(close).search(text, pos)
+        match_sub_str_start = str_start_pattern.search(text, pos, match_fstr_close.end()) if match_fstr_close else str_start_pattern.search(text, pos)
 
         if match_sub_str_start:
-            return self._process_code(text)
+            return self._process_code(text, pos)
         else:
             if match_fstr_close:
-                self.result_lines.append(replace_env_var(text[:match_fstr_close.end()]))
+                self._append_code(text[pos:match_fstr_close.end()])
                 self.state_stack.pop()
                 return match_fstr_close.end()
             else:
-                self.result_lines.append(replace_env_var(text))
+                self._append_code(text[pos:])
                 return len(text)
 
-def PTMLexer(readline: Callable[[], str]) -> str:
+def PTMLexer(source: Union[str, Callable[[], str]]) -> str:
     """
     Lexer for processing PTM files with environment variable support.
-    
+
     This lexer handles string literals and f-strings, replacing environment
     variable references with appropriate os.environ lookups.
-    
+
     Args:
-        readline: A callable that returns the next line of the file
-        
+        source: The source text, or a callable returning it line by line
+
     Returns:
         str: The processed code with environment variables replaced
     """
-    m = LexerMachine()
-
-    while True:
+    if not isinstance(source, str):
+        # Line-callable form kept for compatibility; the state machine
+        # itself always works on the whole buffer.
+        readline = source
+        lines = []
+        # readline-style callables signal EOF with ''; iterator-style ones
+        # raise StopIteration once, caught outside the loop rather than
+        # paying exception setup per line.
         try:
-            line = readline()
-            if not line:
-                break
-            plog.debug(line)
+            while line := readline():
+                lines.append(line)
         except StopIteration:
-            break
+            pass
+        source = ''.join(lines)
+    plog.debug(source)
+
+    # Every piece of ptm sugar starts with '$'; without one the machine
+    # would emit the input verbatim, so skip it with a single C-level scan.
+    if "$" not in source:
+        return source
+
+    # Lexing is a pure function of the source, so identical buffers within
+    # one process (re-included files, repeated loads) hit the memo. Large
+    # sources bypass it to keep the cache from pinning megabytes of text.
+    if len(source) < (1 << 20):
+        return _lex_source(source)
+    return _lex_uncached(source)
+
+
+@functools.lru_cache(maxsize=256)
+def _lex_source(source: str) -> str:
+    return _lex_uncached(source)
 
-        m.process_line(line)
+
+def _lex_uncached(source: str) -> str:
+    m = LexerMachine()
+    m.process(source)
 
     plog.debug("PTMLexer done:", m.result_lines)
     return ''.join(map(str, m.result_lines))
@@ -237,12 +311,51 @@ class PTMLoader(SourceLoader):
         # generate de-sugared cache file
         if self.type == "ptm":
             self.cache = os.path.join(os.path.dirname(self.path), f".{os.path.basename(self.path)}.py")
+            # The stat memo lives for the whole process and include() never
+            # clears it; an edit between two includes must not be masked by
+            # a stale entry, so the freshness check always re-stats the
+            # source. It runs once per include, so the memo buys nothing
+            # here anyway.
+            invalidate_stat(self.path)
             if not self._is_cache_valid():
-                plog.info(f"Generating de-sugared PTM file: {self.cache}")
                 with open(self.path, "r", encoding="utf-8") as f:
-                        content = PTMLexer(f.readline)
-                with open(self.cache, "w", encoding="utf-8") as f:
-                    f.write(content)
+                    source = f.read()
+
+                # A touch without a content change (editor save, checkout)
+                # only invalidates the mtime ordering; the digest sidecar
+                # lets us freshen the cache instead of re-lexing.
+                digest = hashlib.blake2b(source.encode("utf-8"), digest_size=16).hexdigest()
+                sidecar = self.cache + ".sha"
+                if self._sidecar_digest(sidecar) == digest and os.path.exists(self.cache):
+                    plog.debug(f"PTM file touched but unchanged, freshening cache: {self.cache}")
+                    os.utime(self.cache)
+                else:
+                    plog.info(f"Generating de-sugared PTM file: {self.cache}")
+                    content = PTMLexer(source)
+                    self._atomic_write(self.cache, content)
+                    self._atomic_write(sidecar, f"{__version__}:{digest}")
+                invalidate_stat(self.cache)
+
+    @staticmethod
+    def _sidecar_digest(sidecar: str) -> Optional[str]:
+        # The sidecar records "<ptm version>:<digest>"; a cache lexed by a
+        # different ptm (different grammar, different output) is treated
+        # as absent so it gets regenerated.
+        try:
+            with open(sidecar, "r", encoding="utf-8") as f:
+                version, _, digest = f.read().strip().partition(":")
+        except OSError:
+            return None
+        return digest if version == __version__ else None
+
+    @staticmethod
+    def _atomic_write(path: str, content: str) -> None:
+        # Write-then-replace so a concurrent ptm process never imports a
+        # partially written cache file.
+        tmp = f"{path}.tmp.{os.getpid()}"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(tmp, path)
 
     def _is_cache_valid(self) -> bool:
         """
@@ -251,13 +364,20 @@ class PTMLoader(SourceLoader):
         Returns:
             bool: True if cache is valid
         """
-        if not os.path.exists(self.cache):
+        cache_stat = cached_stat(self.cache)
+        if cache_stat is None:
+            return False
+
+        ptm_stat = cached_stat(self.path)
+        if ptm_stat is None:
             return False
-        
-        ptm_mtime = os.path.getmtime(self.path)
-        cache_mtime = os.path.getmtime(self.cache)
-        
-        return cache_mtime >= ptm_mtime
+
+        if cache_stat.st_mtime < ptm_stat.st_mtime:
+            return False
+
+        # A fresh-looking cache lexed by another ptm version is stale: the
+        # grammar may have changed since it was generated.
+        return self._sidecar_digest(self.cache + ".sha") is not None
 
     def get_filename(self, fullname: str) -> str:
         """
@@ -303,3 +423,50 @@ class PTMLoader(SourceLoader):
                 traceback.print_exc()
                 sys.exit(1)
             raise e
+
+def _discover_includes(root: str) -> set:
+    """
+    Collect the transitive closure of statically written include() paths.
+
+    Only string-literal arguments can be discovered; dynamically computed
+    paths are simply not prewarmed. Relative paths resolve against the
+    including file's directory, matching include() semantics.
+    """
+    pending = [os.path.abspath(root)]
+    found: set = set()
+
+    while pending:
+        path = pending.pop()
+        if path in found or not path.endswith(".ptm"):
+            continue
+
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                source = f.read()
+        except OSError:
+            continue
+
+        found.add(path)
+        base_dir = os.path.dirname(path)
+        for match in include_pattern.finditer(source):
+            pending.append(os.path.abspath(os.path.join(base_dir, match.group("path"))))
+
+    return found
+
+
+def prewarm_lex_caches(root: str) -> None:
+    """
+    Lex every statically discoverable include of `root` ahead of execution.
+
+    Lexing is a pure function of file contents and the dominant cost of
+    loading a large include graph, so stale caches are regenerated
+    concurrently before the sequential exec_module phase. Errors are left
+    for include() to surface in order.
+    """
+    files = sorted(_discover_includes(root))
+    if len(files) < 2:
+        return
+
+    with ThreadPoolExecutor(max_workers=min(len(files), os.cpu_count() or 1)) as pool:
+        for file in files:
+            pool.submit(PTMLoader, file, file)
@@ -1,8 +1,8 @@
 import os
-import functools
-from typing import List, Dict, Callable, Optional, Union
+from typing import List, Dict, Callable, Optional, Tuple, Union
 
-from ..system.logger import plog
+from .logger import plog
+from .cache import BuildCache, clear_stat_cache
 from .scheduler import BuildScheduler
 from .recipe import BuildTargetType, BuildTarget, BuildRecipe, DependencyTree
 
@@ -15,8 +15,19 @@ class BuildSystem:
             raise RuntimeError("BuildSystem is a singleton")
             
         self.recipe_lut: Dict[BuildTarget, BuildRecipe] = {}
+        # Reverse indices for target lookup by display name or uid; kept in
+        # sync by _register_target so _find_target never scans the registry.
+        self._by_name: Dict[str, BuildTarget] = {}
+        self._by_uid: Dict[Union[str, int], BuildTarget] = {}
         self.default_max_jobs: int = os.cpu_count() or 1
         self.ptm_srcs: set[str] = set()
+        self.build_cache = BuildCache()
+
+        # Dependency trees are cached per registry generation; registering a
+        # target or adding a dependency bumps the generation, so stale
+        # entries are simply never hit again.
+        self._tree_cache: Dict[Tuple[Union[str, Callable, BuildTarget], int], DependencyTree] = {}
+        self._lut_version: int = 0
 
     @classmethod
     def get_instance(cls) -> 'BuildSystem':
@@ -44,17 +55,28 @@ class BuildSystem:
         if external and (len(func_sig_args) < 3 or func_sig_args[2] != 'jobs'):
             raise ValueError("If external is specified, task must accept 'jobs' parameter")
 
-        # Pass the display name to the partial function
+        # Display names handed to the recipe function at call time
         target_name = build_target.name
         depends_names = [dep.name if dep.type == BuildTargetType.TASK else dep.uid for dep in build_depends]
         plog.debug(f"Registering target '{target_name}' with depends {depends_names} (external={external})")
 
-        partial_func = functools.partial(func, target=target_name, depends=depends_names)
-        partial_func.__name__ = func.__name__
-        build_recipe = BuildRecipe(partial_func, build_target, build_depends, external=bool(external))
+        build_recipe = BuildRecipe(func, build_target, build_depends, external=bool(external),
+                                   target_name=target_name, depends_names=depends_names)
         self.recipe_lut[build_target] = build_recipe
+        self._by_name[build_target.name] = build_target
+        self._by_uid[build_target.uid] = build_target
+        self._lut_version += 1
         return func
 
+    def _find_target(self, look_for: Union[str, Callable]) -> BuildTarget:
+        if callable(look_for):
+            look_for = look_for.__name__
+
+        build_target = self._by_name.get(look_for) or self._by_uid.get(look_for)
+        if build_target is None:
+            raise ValueError(f"Target '{look_for}' not found")
+        return build_target
+
     def template(self, targets: List[Union[str, Callable]], depends: Union[List[Union[str, Callable]], Callable] = [], external: bool = False):
         def decorator(func):
             for target in targets:
@@ -84,11 +106,19 @@ class BuildSystem:
         return decorator
 
     def generate_dependency_tree(self, target: Union[str, Callable, BuildTarget]) -> DependencyTree:
-        return DependencyTree(target, self.recipe_lut)
+        if not isinstance(target, BuildTarget):
+            target = self._find_target(target)
+        cache_key = (target, self._lut_version)
+        tree = self._tree_cache.get(cache_key)
+        if tree is None:
+            tree = DependencyTree(target, self.recipe_lut)
+            self._tree_cache[cache_key] = tree
+        return tree
 
     def build(self, target: Union[str, Callable, BuildTarget], max_jobs: int = 1) -> int:
+        clear_stat_cache()
         tree = self.generate_dependency_tree(target)
-        scheduler = BuildScheduler(tree.generate_build_order(), max_jobs)
+        scheduler = BuildScheduler(tree.generate_build_order(), max_jobs, self.build_cache)
         exitcode = scheduler.run()
         return exitcode
     
@@ -100,6 +130,7 @@ class BuildSystem:
             raise ValueError(f"Target '{build_target}' not found")
 
         self.recipe_lut[build_target].depends.extend(build_depends)
+        self._lut_version += 1
 
     def list_targets(self) -> None:
         plog.info("Available targets:")
@@ -110,7 +141,11 @@ class BuildSystem:
 
     def clean(self) -> None:
         self.recipe_lut.clear()
+        self._by_name.clear()
+        self._by_uid.clear()
         self.ptm_srcs.clear()
+        self._tree_cache.clear()
+        self._lut_version += 1
 
 # Create global instance and decorator
 builder = BuildSystem.get_instance()
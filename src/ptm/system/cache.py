@@ -0,0 +1,193 @@
+"""
+Module for the persistent incremental-build cache.
+"""
+
+import os
+import json
+import hashlib
+from typing import Dict, Iterable, Optional
+
+from .logger import plog
+
+CACHE_FILE = ".ptm-cache.json"
+
+# Fingerprints are taken from mtime+size by default, which checks a large
+# source tree with one stat per file instead of reading every byte. The
+# trade-off: an in-place write that preserves both size and mtime goes
+# undetected. Set PTM_STRICT_HASH=1 to hash file contents instead.
+STRICT_HASH = os.getenv("PTM_STRICT_HASH") == "1"
+
+
+# Single-build stat memoization: many targets share dependencies (and
+# directories), so the same path gets stat'd over and over during one
+# build. Entries live for one build only; BuildSystem.build and the CLI
+# loop reset the cache so a new pass sees fresh filesystem state.
+_stat_cache: Dict[str, Optional[os.stat_result]] = {}
+
+
+def cached_stat(path: str) -> Optional[os.stat_result]:
+    try:
+        return _stat_cache[path]
+    except KeyError:
+        pass
+
+    try:
+        st = os.stat(path)
+    except OSError:
+        st = None
+    _stat_cache[path] = st
+    return st
+
+
+def invalidate_stat(path: str) -> None:
+    _stat_cache.pop(path, None)
+
+
+def prefetch_stats(paths: Iterable[str]) -> None:
+    """
+    Batch-populate the stat memo, one scandir per distinct directory.
+
+    scandir returns dirent and stat information together, so priming all
+    dependencies of a build costs roughly one syscall per directory
+    instead of one per file. Paths whose entries are not found are
+    recorded as missing.
+    """
+    wanted: Dict[str, set] = {}
+    for path in paths:
+        if path not in _stat_cache:
+            directory, name = os.path.split(path)
+            wanted.setdefault(directory, set()).add(name)
+
+    for directory, names in wanted.items():
+        try:
+            with os.scandir(directory or ".") as entries:
+                for entry in entries:
+                    if entry.name in names:
+                        try:
+                            st = entry.stat()
+                        except OSError:
+                            st = None
+                        _stat_cache[os.path.join(directory, entry.name)] = st
+                        names.discard(entry.name)
+                        if not names:
+                            break
+        except OSError:
+            pass
+        for name in names:
+            _stat_cache[os.path.join(directory, name)] = None
+
+
+def clear_stat_cache() -> None:
+    _stat_cache.clear()
+
+
+class BuildCache:
+    """
+    Persistent fingerprint store backing incremental builds.
+
+    Each entry maps a file target to a digest of its inputs taken right
+    after the target was last built successfully. A recipe whose inputs
+    still match the recorded digest can be skipped even when raw mtime
+    ordering would suggest a rebuild.
+    """
+
+    def __init__(self, path: str = CACHE_FILE):
+        self.path = path
+        self.entries: Dict[str, str] = {}
+        # Strict-mode memo: path -> (mtime_ns, size, content digest). A
+        # file whose stat signature is unchanged keeps its digest, so
+        # strict builds only re-read files that actually moved.
+        self.digests: Dict[str, list] = {}
+        self._loaded = False
+        self._dirty = False
+
+    def _load(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        if not isinstance(data, dict):
+            return
+        if "fingerprints" in data:
+            entries = data.get("fingerprints", {})
+            digests = data.get("digests", {})
+        else:
+            # Cache written before digests were persisted: flat mapping.
+            entries, digests = data, {}
+        self.entries = {str(k): str(v) for k, v in entries.items()}
+        self.digests = {
+            str(k): v for k, v in digests.items()
+            if isinstance(v, list) and len(v) == 3}
+        plog.debug(f"Loaded {len(self.entries)} build cache entries from {self.path}")
+
+    def _file_digest(self, path: str) -> Optional[str]:
+        st = cached_stat(path)
+        if st is None:
+            return None
+
+        cached = self.digests.get(path)
+        if cached is not None and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            return cached[2]
+
+        digest = hashlib.blake2b(digest_size=16)
+        try:
+            with open(path, "rb") as f:
+                while chunk := f.read(1 << 20):
+                    digest.update(chunk)
+        except OSError:
+            return None
+
+        hexdigest = digest.hexdigest()
+        self.digests[path] = [st.st_mtime_ns, st.st_size, hexdigest]
+        self._dirty = True
+        return hexdigest
+
+    def fingerprint(self, paths: Iterable[str]) -> Optional[str]:
+        """
+        Digest the given input files; None if any of them is missing.
+        """
+        self._load()
+        digest = hashlib.blake2b(digest_size=16)
+        for path in sorted(paths):
+            digest.update(path.encode("utf-8", "surrogateescape"))
+            if STRICT_HASH:
+                file_digest = self._file_digest(path)
+                if file_digest is None:
+                    return None
+                digest.update(file_digest.encode("ascii"))
+            else:
+                st = cached_stat(path)
+                if st is None:
+                    return None
+                digest.update(st.st_mtime_ns.to_bytes(16, "little", signed=True))
+                digest.update(st.st_size.to_bytes(8, "little"))
+        return digest.hexdigest()
+
+    def lookup(self, key: str) -> Optional[str]:
+        self._load()
+        return self.entries.get(key)
+
+    def update(self, key: str, fingerprint: str) -> None:
+        self._load()
+        if self.entries.get(key) != fingerprint:
+            self.entries[key] = fingerprint
+            self._dirty = True
+
+    def save(self) -> None:
+        # Fingerprints are taken per completed recipe, so a build that was a
+        # full cache hit has nothing new to record and skips the write.
+        if not self._dirty:
+            return
+
+        try:
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump({"fingerprints": self.entries, "digests": self.digests}, f)
+            self._dirty = False
+        except OSError as e:
+            plog.warning(f"Failed to persist build cache {self.path}: {e}")
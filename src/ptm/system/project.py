@@ -1,4 +1,8 @@
 import os
+import shlex
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from abc import ABC, abstractmethod
 
@@ -10,13 +14,10 @@ class BaseRepository(ABC):
         self.path = Path(path)
 
     def extern_cmd(self, cmd: str, wkdir: Path | None = None, ignore_error: bool = False) -> int:
-        if wkdir:
-            old_cwd = os.getcwd()
-            os.chdir(wkdir)
         plog.info(f"[{self.name}]:", cmd)
-        ret = os.system(cmd)
-        if wkdir:
-            os.chdir(old_cwd)
+        # No shell and no chdir dance: cwd is passed to the child directly,
+        # which also keeps repository operations safe to run concurrently.
+        ret = subprocess.run(shlex.split(cmd), cwd=wkdir).returncode
         if ret != 0 and not ignore_error:
             raise RuntimeError(f"External command '{cmd}' failed with exit code {ret}")
         return ret
@@ -61,8 +62,7 @@ class ArchiveRepository(BaseRepository):
 
     def clean(self):
         if os.path.exists(self.path):
-            os.rmdir(self.path, recursive=True, ignore_errors=True)
-            os.remove()
+            shutil.rmtree(self.path, ignore_errors=True)
 
 class GitRepository(BaseRepository):
     def __init__(self, name: str, path: Path, url: str, type: str, meta: str):
@@ -91,7 +91,7 @@ class GitRepository(BaseRepository):
 
     def clean(self):
         if os.path.exists(self.path):
-            os.rmdir(self.path, recursive=True, ignore_errors=True)
+            shutil.rmtree(self.path, ignore_errors=True)
 
 # {
 #     name: starship
@@ -186,17 +186,25 @@ class Project:
         self.repos.append(repo)
         self.repo_map[name] = repo
 
-    def sync(self, select_repos: list[str] | None = None): 
-        for repo in self.repos:
-            if select_repos is not None and repo.name not in select_repos:
-                continue
-            repo.sync()
+    def _for_each_repo(self, op: str, select_repos: list[str] | None = None):
+        selected = [
+            repo for repo in self.repos
+            if select_repos is None or repo.name in select_repos]
+        if not selected:
+            return
+
+        # Repository operations are independent and mostly network/disk
+        # bound, so run them concurrently: N repos cost the slowest one
+        # instead of the sum.
+        with ThreadPoolExecutor(max_workers=min(16, len(selected))) as pool:
+            for _ in pool.map(lambda repo: getattr(repo, op)(), selected):
+                pass
+
+    def sync(self, select_repos: list[str] | None = None):
+        self._for_each_repo("sync", select_repos)
 
     def clean(self, select_repos: list[str] | None = None):
-        for repo in self.repos:
-            if select_repos is not None and repo.name not in select_repos:
-                continue
-            repo.clean()
+        self._for_each_repo("clean", select_repos)
 
     def get_repo_path(self, repo_name: str) -> Path:
         if repo_name not in self.repo_map:
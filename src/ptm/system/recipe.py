@@ -1,39 +1,81 @@
 import os
+import sys
+import functools
+import weakref
 from enum import Enum
-from typing import List, Dict, Callable, Any, Union
+from typing import List, Dict, Callable, Any, Iterator, Optional, Tuple, Union
 
-from ..system.logger import plog
+from .logger import plog
+from .cache import cached_stat
 
 class BuildTargetType(Enum):
     FILE = "file"
     TASK = "func"
 
+
+@functools.lru_cache(maxsize=4096)
+def _abs_target_path(cwd: str, path: str) -> str:
+    """
+    Normalize a file target path against an explicit working directory.
+
+    The same dependency string is resolved once per BuildTarget that names
+    it; caching skips the repeated normpath work. The cwd is part of the
+    key because include() changes directory per file. The result is
+    interned so uid comparisons in the recipe table are pointer-fast.
+    """
+    return sys.intern(os.path.normpath(os.path.join(cwd, path)))
+
 class BuildTarget:
-    def __init__(self, target: Union[str, Callable]):
+    """
+    Flyweight handle for a build target.
+
+    Instances are interned per (type, uid): naming the same file or task
+    again returns the existing object, so equality in the recipe table is
+    an identity check and the per-target memory cost is paid once. The
+    intern table holds weak references only; targets disappear with the
+    last recipe that uses them.
+    """
+
+    __slots__ = ('type', 'name', 'uid', 'meta', '_func', '_hash', '__weakref__')
+
+    _intern: 'weakref.WeakValueDictionary' = weakref.WeakValueDictionary()
+
+    def __new__(cls, target: Union[str, Callable]):
+        if callable(target):
+            key = (BuildTargetType.TASK, id(target))
+        else:
+            key = (BuildTargetType.FILE, _abs_target_path(os.getcwd(), target))
+
+        inst = cls._intern.get(key)
+        if inst is not None:
+            return inst
+
+        inst = super().__new__(cls)
+        inst.type, inst.uid = key
         if callable(target):
-            self.type = BuildTargetType.TASK
-            self.name = target.__name__
-            self.uid = id(target)
-            self.meta = f"{target.__code__.co_filename}@{target.__code__.co_firstlineno}"
+            inst.name = target.__name__
+            inst.meta = f"{target.__code__.co_filename}@{target.__code__.co_firstlineno}"
+            # Keep the function alive: uid is its id(), which CPython may
+            # reuse once the function is collected.
+            inst._func = target
         else:
-            self.type = BuildTargetType.FILE
-            self.name = target
-            self.uid = os.path.abspath(target)
+            inst.name = target
+            inst.meta = None
+            inst._func = None
+        inst._hash = hash(key)
+        cls._intern[key] = inst
+        return inst
 
     def __hash__(self):
-        return hash((self.type, self.uid))
-    
+        return self._hash
+
     def __eq__(self, other):
+        if self is other:
+            return True
         if not isinstance(other, BuildTarget):
             return False
-        if self.type != other.type:
-            return False
-        if self.name != other.name:
-            return False
-        if self.uid != other.uid:
-            return False
-        return True
-    
+        return self.type == other.type and self.uid == other.uid
+
     def __str__(self):
         if self.type == BuildTargetType.TASK:
             return f"{self.name} [{self.meta}]"
@@ -45,43 +87,74 @@ class BuildTarget:
 
 
 class BuildRecipe:
-    def __init__(self, recipe: Callable, target: BuildTarget, depends: List[BuildTarget], external: bool = False, depth: int = -1):
+
+    # One instance per graph node; slot storage keeps large builds from
+    # paying a __dict__ per recipe.
+    __slots__ = ('target', 'depends', 'recipe', 'external',
+                 'target_name', 'depends_names', 'depth', 'children')
+
+    def __init__(self, recipe: Callable, target: BuildTarget, depends: List[BuildTarget], external: bool = False, depth: int = -1,
+                 target_name: Optional[str] = None, depends_names: Optional[List[str]] = None):
         self.target = target
         self.depends = depends
         self.recipe = recipe
         self.external = external
 
+        # Display names passed to the recipe function; stored directly
+        # instead of binding them into a functools.partial per recipe.
+        self.target_name = target_name
+        self.depends_names = depends_names
+
         # Dependency Graph
         self.depth = depth
         self.children: List['BuildRecipe'] = []
 
     def _get_timestamp(self, path: str) -> int:
-        if os.path.exists(path):
-            return os.stat(path).st_mtime_ns
-        else:
-            return 0
+        # One memoized stat instead of exists+stat; shared dependencies are
+        # checked by many recipes within a single build.
+        st = cached_stat(path)
+        return st.st_mtime_ns if st is not None else 0
 
-    def outdate(self) -> bool:        
+    def input_fingerprint(self, cache) -> Optional[str]:
+        if self.target.type == BuildTargetType.TASK:
+            return None
+        if not self.depends or any(dep.type == BuildTargetType.TASK for dep in self.depends):
+            return None
+        return cache.fingerprint(dep.uid for dep in self.depends)
+
+    def outdate(self, cache=None) -> bool:
         if self.target.type == BuildTargetType.TASK:
             return True
 
-        target_timestamp = self._get_timestamp(self.target.uid)
+        get_timestamp = self._get_timestamp
+        target_timestamp = get_timestamp(self.target.uid)
         if target_timestamp == 0:
             return True
-        for depend in self.depends:
-            if depend.type == BuildTargetType.TASK:
-                return True
-            if self._get_timestamp(depend.uid) >= target_timestamp:
-                return True
 
-        return False
+        # Short-circuits on the first stale dependency; in a typical
+        # incremental build one hit is enough to decide.
+        stale = any(
+            depend.type == BuildTargetType.TASK or get_timestamp(depend.uid) >= target_timestamp
+            for depend in self.depends)
+        if not stale:
+            return False
+
+        # The mtime order looks stale, but if the inputs still match the
+        # fingerprint recorded after the last successful build the target
+        # is in fact up to date. (With a task dependency the fingerprint
+        # is None and the rebuild stands.)
+        if cache is not None:
+            fingerprint = self.input_fingerprint(cache)
+            if fingerprint is not None and cache.lookup(self.target.uid) == fingerprint:
+                return False
+        return True
 
     def build(self, jobs: int = 1, **kwargs) -> Any:
         if self.outdate():
             plog.info(f"Building target: {self.target}")
             if self.external:
                 kwargs['jobs'] = jobs
-            self.recipe(**kwargs)
+            self.recipe(target=self.target_name, depends=self.depends_names, **kwargs)
     
     def add_child(self, child: 'BuildRecipe') -> None:
         self.children.append(child)
@@ -94,12 +167,11 @@ class DependencyTree:
     def __init__(self, target: Union[str, Callable, BuildTarget], recipe_lut: Dict[BuildTarget, BuildRecipe]):
         self.max_depth = 0
         self.recipe_lut: Dict[BuildTarget, BuildRecipe] = recipe_lut
-        self.depth_map: Dict[int, set[BuildRecipe]] = {}
+        self.nodes: List[BuildRecipe] = []
 
         if not isinstance(target, BuildTarget):
             target = self._find_target(target)
-        self.root = self._build_tree(target, [], 0)
-        self._compute_depth_map(self.root)
+        self.root = self._build_tree(target)
 
     def _find_target(self, look_for: str | Callable) -> BuildTarget:
         if callable(look_for):
@@ -113,64 +185,86 @@ class DependencyTree:
 
         raise ValueError(f"Target '{look_for}' not found")
 
-    def _build_tree(self, target: BuildTarget, history: List[BuildTarget], depth: int = 0) -> BuildRecipe | None:
-        plog.debug(f"Building tree node for target '{target}' at depth {depth}")
-
-        if target not in self.recipe_lut:
+    def _materialize(self, target: BuildTarget) -> BuildRecipe:
+        recipe = self.recipe_lut.get(target)
+        if recipe is None:
             if target.type == BuildTargetType.FILE and os.path.exists(target.uid):
-                leaf = BuildRecipe(None, target, [], depth=depth)
-                self.recipe_lut[target] = leaf
-                return leaf
+                recipe = BuildRecipe(None, target, [])
+                self.recipe_lut[target] = recipe
             else:
                 raise ValueError(f"Target '{target}' not found")
-        
-        target_recipe = self.recipe_lut[target]
-
-        if depth > self.max_depth:
-            self.max_depth = depth
-
-        if target_recipe.depth >= 0:
-            if depth > target_recipe.depth:
-                self._update_subtree_depth(target_recipe, depth)
-            return target_recipe
-
-        target_recipe = self.recipe_lut[target]
-        target_recipe.depth = depth
-
-        for dep in target_recipe.depends:
-            if dep in history:
-                plog.info(f"Circular dependency {target} <- {dep} dropped.")
+        return recipe
+
+    def _expand(self, recipe: BuildRecipe, ancestors: set[BuildTarget]) -> Iterator[BuildRecipe]:
+        """
+        Yield the child recipes of `recipe`, building the edges on first
+        expansion. A node expanded by an earlier tree over the same recipe
+        table keeps its edges and is only re-traversed.
+        """
+        if recipe.depth < 0:
+            recipe.depth = 0
+            for dep in recipe.depends:
+                if dep in ancestors:
+                    plog.info(f"Circular dependency {recipe.target} <- {dep} dropped.")
+                    continue
+                child = self._materialize(dep)
+                recipe.add_child(child)
+                yield child
+        else:
+            yield from recipe.children
+
+    def _build_tree(self, target: BuildTarget) -> BuildRecipe:
+        """
+        Walk the dependency graph with an explicit stack; recursion depth is
+        bounded by the C stack while build graphs are not. One DFS collects
+        a post-order, then a single sweep in topological (reverse post-)
+        order assigns longest-path depths and buckets nodes by depth — no
+        subtree re-walks when a shared node is reached on a deeper path.
+        """
+        root_recipe = self._materialize(target)
+
+        # `ancestors` holds the targets on the path from the root to the
+        # node currently being expanded; an edge back into it is a cycle
+        # and gets dropped. One mutable set with add/discard backtracking
+        # keeps the membership test O(1) with no per-level copies.
+        seen: set[BuildRecipe] = {root_recipe}
+        postorder: List[BuildRecipe] = []
+        ancestors: set[BuildTarget] = {target}
+        stack: List[Tuple[BuildRecipe, Iterator[BuildRecipe]]] = [
+            (root_recipe, self._expand(root_recipe, ancestors))]
+
+        while stack:
+            recipe, edges = stack[-1]
+            child = next(edges, None)
+            if child is None:
+                stack.pop()
+                ancestors.discard(recipe.target)
+                postorder.append(recipe)
                 continue
-
-            child_node = self._build_tree(dep, history + [target], depth + 1)
-            target_recipe.add_child(child_node)
-
-        return target_recipe
-
-    def _update_subtree_depth(self, node: BuildRecipe, new_depth: int) -> None:
-        plog.debug(f"Updating depth for node '{node.target}' from {node.depth} to {new_depth}")
-        if new_depth <= node.depth:
-            return
-
-        if new_depth > self.max_depth:
-            self.max_depth = new_depth
-
-        node.depth = new_depth
-        for child in node.children:
-            self._update_subtree_depth(child, new_depth + 1)
-    
-    def _compute_depth_map(self, node: BuildRecipe) -> None:
-        if node.depth not in self.depth_map:
-            self.depth_map[node.depth] = set()
-        self.depth_map[node.depth].add(node)
-        
-        for child in node.children:
-            self._compute_depth_map(child)
+            if child in seen:
+                continue
+            seen.add(child)
+            ancestors.add(child.target)
+            stack.append((child, self._expand(child, ancestors)))
+
+        for recipe in postorder:
+            recipe.depth = 0
+        for recipe in reversed(postorder):
+            depth = recipe.depth
+            if depth > self.max_depth:
+                self.max_depth = depth
+            next_depth = depth + 1
+            for child in recipe.children:
+                if child.depth < next_depth:
+                    child.depth = next_depth
+        self.nodes = postorder
+
+        return root_recipe
 
     def generate_build_order(self) -> List[BuildRecipe]:
-        build_order: List[BuildRecipe] = []
-        for depth in sorted(self.depth_map.keys(), reverse=True):
-            build_order.extend(self.depth_map[depth])
+        # One key-sort over the node list; there is no intermediate
+        # depth-bucketed dict to build and immediately tear down.
+        build_order = sorted(self.nodes, key=lambda node: node.depth, reverse=True)
         plog.debug(f"Generated build order: {build_order}")
         return build_order
     
@@ -183,8 +277,12 @@ class DependencyTree:
         return dep_src
 
     def __repr__(self) -> str:
+        # Bucketing by depth is only needed for display; build it here
+        # rather than carrying the map through every construction.
+        depth_map: Dict[int, List[BuildRecipe]] = {}
+        for node in self.nodes:
+            depth_map.setdefault(node.depth, []).append(node)
         lines = [f"BuildTree (max_depth={self.max_depth})"]
-        for depth in sorted(self.depth_map.keys()):
-            nodes = self.depth_map[depth]
-            lines.append(f"  Depth {depth}: {[node.target for node in nodes]}")
+        for depth in sorted(depth_map.keys()):
+            lines.append(f"  Depth {depth}: {[node.target for node in depth_map[depth]]}")
         return "\n".join(lines)
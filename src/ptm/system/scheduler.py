@@ -1,121 +1,175 @@
-import os
-import signal
+import sys
 import multiprocessing as mp
+import multiprocessing.connection
+from array import array
+from collections import deque
 from typing import List, Dict, Optional, Tuple
 
-from ..system.logger import plog
-from .recipe import BuildRecipe
+from .logger import plog
+from .cache import BuildCache, invalidate_stat, prefetch_stats
+from .recipe import BuildRecipe, BuildTargetType
 
 
-def _proc_run_target(recipe: BuildRecipe, jobs_alloc: int) -> None:
+# Build order of the scheduler currently running, published before any
+# task is forked. The child resolves its recipe from this list through
+# copy-on-write memory, so the Process args are two plain integers and
+# the recipe graph is never pickled across the process boundary.
+_shared_build_order: List[BuildRecipe] = []
+
+
+def _proc_run_target(idx: int, jobs_alloc: int) -> None:
     # os.setsid()
-    recipe.build(jobs=jobs_alloc)
+    _shared_build_order[idx].build(jobs=jobs_alloc)
+
+
+# Recipes are closures defined inside de-sugared .ptm modules; they cannot
+# be pickled into pre-spawned pool workers, so every task runs in a forked
+# child that inherits the registry copy-on-write. Pinning the fork context
+# keeps that working when Python changes the platform default.
+if sys.platform != "win32":
+    _mp_context = mp.get_context("fork")
+else:
+    _mp_context = mp.get_context()
 
 class BuildScheduler:
 
-    def __init__(self, build_order: List[BuildRecipe], max_jobs: int):
+    def __init__(self, build_order: List[BuildRecipe], max_jobs: int, cache: Optional[BuildCache] = None):
+        global _shared_build_order
+        _shared_build_order = build_order
         self.max_jobs = max_jobs
         self.cap = max_jobs
         self.build_order = build_order
-        self.remaining_deps: Dict[BuildRecipe, int] = {}
-        for target in self.build_order:
-            self.remaining_deps[target] = len(target.children)
-
-        self.ptr = 0
-        self.wip: Dict[BuildRecipe, Tuple[mp.Process, int]] = {}
-        self.done: set[BuildRecipe] = set()
+        self.cache = cache
+
+        # Successor-release bookkeeping in struct-of-arrays form: targets
+        # are addressed by their index in build_order, so the hot traversal
+        # walks integer adjacency lists instead of hashing recipe objects.
+        # Each target counts its unfinished dependencies and is released
+        # the instant the last one completes.
+        self.index: Dict[BuildRecipe, int] = {t: i for i, t in enumerate(build_order)}
+        self.succ: List[List[int]] = [[] for _ in build_order]
+        self.remaining_deps = array('i', (len(t.children) for t in build_order))
+        self.externals = array('b', (1 if t.external else 0 for t in build_order))
+        for i, target in enumerate(self.build_order):
+            for child in target.children:
+                self.succ[self.index[child]].append(i)
+
+        # Prime the stat memo with one scandir per distinct directory so
+        # the outdate() checks below are dict lookups, not syscalls.
+        paths: set[str] = set()
+        for recipe in build_order:
+            if recipe.target.type == BuildTargetType.FILE:
+                paths.add(recipe.target.uid)
+            for dep in recipe.depends:
+                if dep.type == BuildTargetType.FILE:
+                    paths.add(dep.uid)
+        prefetch_stats(paths)
+
+        self.ready: deque[int] = deque(
+            i for i, n in enumerate(self.remaining_deps) if n == 0)
+        self.wip: Dict[int, Tuple[mp.Process, int]] = {}
+        self.sentinels: Dict[int, int] = {}
+        self.n_done: int = 0
         self.error: Optional[int] = None
 
         self.modifies: set[str] = set()
 
     def _select_and_launch_tasks(self) -> None:
-        look_ahead_limit = min(len(self.build_order), self.ptr + 2 * self.max_jobs)
-        for i in range(self.ptr, look_ahead_limit):
-            if self.cap <= 0:
+        while self.ready and self.cap > 0:
+            idx = self.ready[0]
+            target = self.build_order[idx]
+
+            if not target.outdate(self.cache):
+                self.ready.popleft()
+                if target.recipe:
+                    plog.info(f"Target '{target.target}' is up to date")
+                self._handle_completed_task(idx, 0, 0)
+                continue
+
+            if self.externals[idx]:
+                # External targets get the whole job budget, so wait for the
+                # machine to drain before launching one.
+                if len(self.wip) == 0:
+                    self.ready.popleft()
+                    self._launch_task(idx, self.max_jobs)
                 break
-                
-            target = self.build_order[i]
-
-            if target not in self.done and target not in self.wip and self.remaining_deps.get(target, 0) == 0:
-                if not target.outdate():
-                    if target.recipe:
-                        plog.info(f"Target '{target.target}' is up to date")
-                    self._handle_completed_task(target, 0, 0)
-                    continue
-
-                if target.external:
-                    if len(self.wip) == 0:
-                        self._launch_task(target, self.max_jobs)
-                    break
-                else:
-                    self._launch_task(target, 1)
-                    continue
-        
-
-    def _launch_task(self, target: BuildRecipe, cores: int) -> None:
+            else:
+                self.ready.popleft()
+                self._launch_task(idx, 1)
+
+
+    def _launch_task(self, idx: int, cores: int) -> None:
+        target = self.build_order[idx]
         plog.debug(f"Build {target.target} with {cores} cores")
-        proc = mp.Process(target=_proc_run_target, args=(target, cores), name=f"ptm@{self.max_jobs - self.cap}")
-        self.cap -= cores
-        self.wip[target] = (proc, cores)
+        proc = _mp_context.Process(target=_proc_run_target, args=(idx, cores), name=f"ptm@{self.max_jobs - self.cap}")
+        self._acquire_jobs(cores)
+        self.wip[idx] = (proc, cores)
         proc.start()
+        self.sentinels[proc.sentinel] = idx
 
-    def _parse_wait_status(self, status):
-        if os.WIFEXITED(status):
-            return os.WEXITSTATUS(status)
-        if os.WIFSIGNALED(status):
-            return -os.WTERMSIG(status)
-        return -1
-
-    def _handle_completed_task(self, recipe: BuildRecipe, cores: int, exitcode: int) -> None:
-        if recipe in self.wip:
-            self.wip.pop(recipe)
-            self.cap += cores
+    def _acquire_jobs(self, cores: int) -> None:
+        self.cap -= cores
+
+    def _release_jobs(self, cores: int) -> None:
+        self.cap += cores
+
+    def _handle_completed_task(self, idx: int, cores: int, exitcode: int) -> None:
+        recipe = self.build_order[idx]
+        built = idx in self.wip
+        if built:
+            self.wip.pop(idx)
+            self._release_jobs(cores)
             self.modifies.add(recipe.target.uid)
+            # The recipe just rewrote its target; later outdate() checks of
+            # recipes depending on it must observe the fresh mtime.
+            invalidate_stat(recipe.target.uid)
 
-        self.done.add(recipe)
-        for t in self.build_order:
-            if recipe.target in t.depends:
-                self.remaining_deps[t] -= 1
+        self.n_done += 1
+        for parent in self.succ[idx]:
+            self.remaining_deps[parent] -= 1
+            if self.remaining_deps[parent] == 0:
+                self.ready.append(parent)
 
         if exitcode == 0:
             if recipe.recipe:
                 plog.debug(f"Target {recipe.target} completed successfully")
+            if built and self.cache is not None:
+                fingerprint = recipe.input_fingerprint(self.cache)
+                if fingerprint is not None:
+                    self.cache.update(recipe.target.uid, fingerprint)
         else:
             plog.info(f"Target {recipe.target} failed with exit code {exitcode}")
+            # First failure cancels everything still pending; in-flight
+            # processes are torn down by _cleanup before run() returns.
+            self.ready.clear()
             self.error = exitcode
 
     def _wait_for_completion(self) -> None:
         if not self.wip:
             return
 
-        reaped_pid = None
-        reaped_exitcode = None
-
-        try:
-            pid, status = os.waitpid(-1, 0)
-            reaped_pid = pid
-            reaped_exitcode = self._parse_wait_status(status)
-        except ChildProcessError:
-            pass
-
-        for recipe, (proc, alloc) in list(self.wip.items()):
-            if reaped_pid and proc.pid == reaped_pid:
-                exitcode = reaped_exitcode
-            elif not proc.is_alive():
-                exitcode = proc.exitcode if proc.exitcode is not None else -1
-            else:
-                continue
-
-            self._handle_completed_task(recipe, alloc, exitcode)
-
-    def _advance_pointer(self) -> None:
-        while self.ptr < len(self.build_order) and self.build_order[self.ptr] in self.done:
-            self.ptr += 1
+        # Block until at least one child exits; sentinels identify the
+        # finished processes directly, so there is no pid scan and no race
+        # against multiprocessing's own reaping. Several tasks finishing
+        # close together are all handled in one wakeup.
+        for sentinel in mp.connection.wait(list(self.sentinels)):
+            idx = self.sentinels.pop(sentinel)
+            proc, alloc = self.wip[idx]
+            proc.join()
+            exitcode = proc.exitcode if proc.exitcode is not None else -1
+            self._handle_completed_task(idx, alloc, exitcode)
 
     def _cleanup(self) -> None:
+        # Workers are forked without os.setsid(), so they share ptm's own
+        # process group; a killpg here would take down ptm and its caller
+        # along with the workers. Kill each child individually instead.
         for proc, _ in self.wip.values():
             if proc.is_alive():
-                os.killpg(os.getpgid(proc.pid), signal.SIGKILL)
+                proc.kill()
+        for proc, _ in self.wip.values():
+            proc.join()
+        self.wip.clear()
+        self.sentinels.clear()
 
     def run(self) -> Tuple[int, set[str]]:
         try:
@@ -125,17 +179,22 @@ class BuildScheduler:
                     return self.error, self.modifies
 
                 # TODO: better check logic
-                if len(self.done) == len(self.build_order):
+                if self.n_done == len(self.build_order):
                     plog.debug("All targets completed")
                     return 0, self.modifies
 
-                self._advance_pointer()
                 self._select_and_launch_tasks()
 
                 if len(self.wip) > 0:
                     self._wait_for_completion()
+                elif not self.ready:
+                    plog.error("Scheduler stalled with unfinished targets")
+                    return -1, self.modifies
 
         except KeyboardInterrupt:
             plog.info("Build interrupted by user")
             self._cleanup()
             return 130, self.modifies
+        finally:
+            if self.cache is not None:
+                self.cache.save()
@@ -145,3 +145,30 @@ def test_dynamic_dependency(tmp_path):
     
     builder.build(str(target_file))
     assert target_file.read_text() == "PHANTOM-MAKE"
+
+def test_fingerprint_cache_skips_unchanged_inputs(tmp_path):
+    """Test that the build cache skips rebuilds when inputs are unchanged"""
+    builder.clean()
+
+    dep_file = tmp_path / "input.txt"
+    target_file = tmp_path / "output.txt"
+    marker_file = tmp_path / "marker.txt"
+
+    dep_file.write_text("input data")
+
+    @target(str(target_file), [str(dep_file)])
+    def build_output(target, depends):
+        with open(marker_file, 'a') as f:
+            f.write("x")
+        with open(target, 'w') as f:
+            f.write("output")
+
+    builder.build(str(target_file))
+    assert marker_file.read_text() == "x"
+
+    # Give the target the same mtime as the dependency: raw mtime ordering
+    # says stale, but the recorded input fingerprint still matches.
+    dep_stat = os.stat(dep_file)
+    os.utime(target_file, ns=(dep_stat.st_atime_ns, dep_stat.st_mtime_ns))
+    builder.build(str(target_file))
+    assert marker_file.read_text() == "x"
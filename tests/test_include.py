@@ -101,3 +101,39 @@ def test_include_subdirectory_relative_path2(tmp_path):
     second = include(str(second_level_ptm))
     assert second.third.__file__ == str(third_level_ptm)
     assert second.third.USER == os.environ['USER']
+
+def test_include_reuses_executed_module(simple_ptm_file):
+    """Test that repeated includes of an unchanged file reuse the module"""
+    # Pre-generate a valid de-sugared cache so the first include takes the
+    # cache-hit path (and memoizes the source's stat along the way).
+    from ptm.syntax.loader import PTMLoader
+    PTMLoader(str(simple_ptm_file), str(simple_ptm_file))
+
+    first = include(str(simple_ptm_file))
+    second = include(str(simple_ptm_file))
+    assert second is first
+
+    # Changing the file invalidates the cached module
+    os.utime(simple_ptm_file, ns=(0, 0))
+    simple_ptm_file.write_text(simple_ptm_file.read_text() + "\nextra = 1\n")
+    third = include(str(simple_ptm_file))
+    assert third is not first
+    assert third.extra == 1
+
+    # And the re-executed module is reused in turn
+    fourth = include(str(simple_ptm_file))
+    assert fourth is third
+
+def test_prewarm_lex_caches_nested(tmp_path):
+    """Test that prewarming lexes statically discoverable includes"""
+    from ptm.syntax.loader import prewarm_lex_caches
+
+    child = tmp_path / "child.ptm"
+    child.write_text('greeting = f"hi {${USER}}"\n')
+    root = tmp_path / "root.ptm"
+    root.write_text('child = include("child.ptm")\n')
+
+    prewarm_lex_caches(str(root))
+
+    assert (tmp_path / ".root.ptm.py").exists()
+    assert (tmp_path / ".child.ptm.py").exists()
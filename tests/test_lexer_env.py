@@ -1,7 +1,9 @@
+import io
 from ptm.syntax.loader import *
 
 def iter_lines(code):
-    return iter(code.splitlines(True)).__next__
+    # StringIO.readline is a C-level callable returning '' at EOF.
+    return io.StringIO(code).readline
  
 def test_lexer_env_single_line_code():
     """Test environment variables in single line code."""
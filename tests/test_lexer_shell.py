@@ -1,8 +1,10 @@
+import io
 import os
 from ptm.syntax.loader import *
 
 def iter_lines(code):
-    return iter(code.splitlines(True)).__next__
+    # StringIO.readline is a C-level callable returning '' at EOF.
+    return io.StringIO(code).readline
 
 def test_shell_simple():
     """Test shell command syntax."""